@@ -1,5 +1,14 @@
 from pathlib import Path
 import json
+import os
+import sys
+
+def _entries(p):
+    """Return the set of entry names in a directory, or None if it doesn't exist"""
+    try:
+        return {e.name for e in os.scandir(p)}
+    except FileNotFoundError:
+        return None
 
 def check_cluster():
     cluster_dir = Path("rl-swarm-cluster")
@@ -8,57 +17,63 @@ def check_cluster():
         print("❌ Cluster directory not found. Run setup_cluster_basic.sh first.")
         return
     
-    print("🔍 Checking cluster setup...\n")
+    # Collect the report and write it once at the end
+    out = ["🔍 Checking cluster setup...\n"]
     
     # Check credentials directory
     credentials_dir = cluster_dir / "credentials"
-    print("📁 Credentials directory:")
+    out.append("📁 Credentials directory:")
     
+    cred_names = _entries(credentials_dir) or set()
     required_creds = ["swarm.pem", "userApiKey.json", "userData.json"]
     for file_name in required_creds:
-        file_path = credentials_dir / file_name
-        status = "✅" if file_path.exists() else "❌"
-        print(f"   {status} {file_name}")
+        status = "✅" if file_name in cred_names else "❌"
+        out.append(f"   {status} {file_name}")
     
-    print()
+    out.append("")
     
     # Check each node
     ready_nodes = 0
     for i in range(1, 11):
         node_dir = cluster_dir / f"node_{i}"
-        print(f"🏠 Node_{i}:")
+        out.append(f"🏠 Node_{i}:")
         
+        names = _entries(node_dir)
+        exists = names is not None
+        names = names or set()
         checks = [
-            (node_dir.exists(), "Directory"),
-            ((node_dir / "main.py").exists(), "main.py"),
-            ((node_dir / f"venv_node_{i}").exists(), "Virtual env"),
-            ((node_dir / "swarm.pem").exists(), "swarm.pem"),
-            ((node_dir / "userApiKey.json").exists(), "userApiKey.json"),
-            ((node_dir / "userData.json").exists(), "userData.json"),
+            (exists, "Directory"),
+            ("main.py" in names, "main.py"),
+            (f"venv_node_{i}" in names, "Virtual env"),
+            ("swarm.pem" in names, "swarm.pem"),
+            ("userApiKey.json" in names, "userApiKey.json"),
+            ("userData.json" in names, "userData.json"),
         ]
         
         node_ready = True
         for status, name in checks:
             icon = "✅" if status else "❌"
-            print(f"   {icon} {name}")
+            out.append(f"   {icon} {name}")
             if not status:
                 node_ready = False
         
         if node_ready:
             ready_nodes += 1
             
-        print()
+        out.append("")
     
-    print(f"📊 Summary: {ready_nodes}/10 nodes ready")
+    out.append(f"📊 Summary: {ready_nodes}/10 nodes ready")
     
     if ready_nodes == 0:
-        print("\n📋 Next steps:")
-        print("1. Place credential files in rl-swarm-cluster/credentials/")
-        print("2. Run: python prepare_credentials.py")
+        out.append("\n📋 Next steps:")
+        out.append("1. Place credential files in rl-swarm-cluster/credentials/")
+        out.append("2. Run: python prepare_credentials.py")
     elif ready_nodes < 10:
-        print("\n⚠️  Some nodes not ready. Run: python prepare_credentials.py")
+        out.append("\n⚠️  Some nodes not ready. Run: python prepare_credentials.py")
     else:
-        print("\n🎉 All nodes ready! Run: python run_cluster.py")
+        out.append("\n🎉 All nodes ready! Run: python run_cluster.py")
+    
+    sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
     check_cluster()
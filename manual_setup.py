@@ -1,82 +1,129 @@
 #!/usr/bin/env python3
 
+import multiprocessing
 import os
+import shutil
+import subprocess
 import sys
 from pathlib import Path
 
+CLUSTER_DIR = os.path.abspath("rl-swarm-cluster")
+REPO_URL = "https://github.com/gensyn-ai/rl-swarm"
+# Cache pip chung, lan setup sau tao lai venv_shared khong phai tai lai
+PIP_CACHE_DIR = os.path.join(CLUSTER_DIR, ".pipcache")
+PACKAGES = ["torch", "numpy", "requests"]
+SHARED_VENV = os.path.join(CLUSTER_DIR, "venv_shared")
+# Dung spawn thay vi fork: worker khong thua ke fd/thread cua process cha.
+# Voi spawn, worker import lai module nay nen chi duoc khai bao hang so o day.
+MP_CONTEXT = multiprocessing.get_context("spawn")
+# Cac file cua venv_shared duoc link vao venv_node_i
+SHARED_VENV_LINKS = ["pyvenv.cfg", "lib", "lib64", "bin/python", "bin/python3",
+                     "bin/pip", "bin/activate"]
+
+def create_venv(venv_path):
+    """Tao venv moi, tra ve True neu thanh cong"""
+    # Xoa venv cu neu co
+    shutil.rmtree(venv_path, ignore_errors=True)
+
+    try:
+        result = subprocess.run(["python3", "-m", "venv", venv_path], check=False).returncode
+    except FileNotFoundError:
+        result = 1
+    if result != 0:
+        result = subprocess.run([sys.executable, "-m", "venv", venv_path], check=False).returncode
+
+    return result == 0
+
+def install_packages(python_exe):
+    """Cai packages, dung cache pip chung"""
+    env = dict(os.environ, PIP_CACHE_DIR=PIP_CACHE_DIR)
+    subprocess.run(
+        [python_exe, "-m", "pip", "install", "--upgrade", "pip", "--quiet"],
+        env=env,
+        check=False,
+    )
+    subprocess.run(
+        [python_exe, "-m", "pip", "install", *PACKAGES, "--quiet"],
+        env=env,
+        check=False,
+    )
+
+def link_shared_venv(venv_path):
+    """Tao venv cua node bang symlink toi venv_shared"""
+    # Xoa venv cu neu co
+    shutil.rmtree(venv_path, ignore_errors=True)
+    os.makedirs(os.path.join(venv_path, "bin"))
+
+    for name in SHARED_VENV_LINKS:
+        target = os.path.join(SHARED_VENV, name)
+        if os.path.lexists(target):
+            link = os.path.join(venv_path, name)
+            os.symlink(os.path.relpath(target, os.path.dirname(link)), link)
+
+def setup_node(i):
+    """Setup mot node, tra ve (node_id, ok, err)"""
+    # Tao thu muc node
+    node_path = os.path.join(CLUSTER_DIR, f"node_{i}")
+    os.makedirs(node_path, exist_ok=True)
+
+    # Clone repo
+    if not os.path.exists(os.path.join(node_path, ".git")):
+        result = subprocess.run(
+            ["git", "clone", REPO_URL, "."],
+            cwd=node_path,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        if result.returncode != 0:
+            return (i, False, "Failed to clone repository")
+
+    # Tao virtual environment, dung chung packages voi venv_shared
+    venv_path = os.path.join(node_path, f"venv_node_{i}")
+    link_shared_venv(venv_path)
+
+    # Kiem tra python executable
+    err = None
+    if not os.path.exists(os.path.join(venv_path, "bin", "python")):
+        err = "Python executable not found"
+
+    # Tao thu muc can thiet (sau khi clone, vi git clone . can thu muc rong)
+    for sub in ("logs", "data", "temp"):
+        os.makedirs(os.path.join(node_path, sub), exist_ok=True)
+
+    return (i, err is None, err)
+
 def simple_setup():
     # Tao thu muc cluster
-    os.makedirs("rl-swarm-cluster/credentials", exist_ok=True)
-    
+    os.makedirs(os.path.join(CLUSTER_DIR, "credentials"), exist_ok=True)
+
+    # Cai packages mot lan vao venv_shared
+    print("Creating shared virtual environment...")
+    if create_venv(SHARED_VENV):
+        print("  Installing packages...")
+        install_packages(os.path.join(SHARED_VENV, "bin", "python"))
+        print("  Packages installed")
+    else:
+        print("  Failed to create virtual environment")
+
     print("Setting up 10 nodes...")
-    
-    for i in range(1, 11):
-        print(f"\nNode {i}:")
-        
-        # Tao thu muc node
-        node_path = f"rl-swarm-cluster/node_{i}"
-        os.makedirs(node_path, exist_ok=True)
-        
-        # Di chuyen vao thu muc node
-        os.chdir(node_path)
-        print(f"  Working in: {os.getcwd()}")
-        
-        # Clone repo
-        if not os.path.exists(".git"):
-            print("  Cloning repository...")
-            result = os.system("git clone https://github.com/gensyn-ai/rl-swarm . 2>/dev/null")
-            if result == 0:
-                print("  Repository cloned successfully")
-            else:
-                print("  Failed to clone repository")
-                os.chdir("../..")
-                continue
-        
-        # Tao virtual environment
-        venv_name = f"venv_node_{i}"
-        print(f"  Creating virtual environment: {venv_name}")
-        
-        # Xoa venv cu neu co
-        if os.path.exists(venv_name):
-            os.system(f"rm -rf {venv_name}")
-        
-        # Tao venv moi
-        result = os.system(f"python3 -m venv {venv_name}")
-        if result != 0:
-            result = os.system(f"python -m venv {venv_name}")
-        
-        if result == 0:
-            print("  Virtual environment created")
-            
-            # Kiem tra python executable
-            python_exe = f"{venv_name}/bin/python"
-            if os.path.exists(python_exe):
-                print("  Python executable found")
-                
-                # Install packages
-                print("  Installing packages...")
-                os.system(f"{python_exe} -m pip install --upgrade pip --quiet")
-                os.system(f"{python_exe} -m pip install torch numpy requests --quiet")
-                print("  Packages installed")
-            else:
-                print("  Python executable not found")
+
+    # Chay song song 10 node, in ket qua sau khi pool dong de khong bi xen output
+    with MP_CONTEXT.Pool(processes=min(10, os.cpu_count() or 1)) as pool:
+        results = pool.map(setup_node, range(1, 11))
+
+    # Gom output lai va ghi mot lan
+    out = []
+    for node_id, ok, err in results:
+        if ok:
+            out.append(f"  Node {node_id} setup completed")
         else:
-            print("  Failed to create virtual environment")
-        
-        # Tao thu muc can thiet
-        os.makedirs("logs", exist_ok=True)
-        os.makedirs("data", exist_ok=True)
-        os.makedirs("temp", exist_ok=True)
-        
-        # Quay lai thu muc goc
-        os.chdir("../..")
-        
-        print(f"  Node {i} setup completed")
-    
-    print("\nSetup finished!")
-    print("Next steps:")
-    print("1. Place credential files in rl-swarm-cluster/credentials/")
-    print("2. Run: python prepare_credentials.py")
+            out.append(f"  Node {node_id} setup failed: {err}")
+
+    out.append("\nSetup finished!")
+    out.append("Next steps:")
+    out.append("1. Place credential files in rl-swarm-cluster/credentials/")
+    out.append("2. Run: python prepare_credentials.py")
+    sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
     simple_setup()
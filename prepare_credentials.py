@@ -1,21 +1,152 @@
 import json
-import shutil
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+NODE_ID_SENTINEL = "__NODE_ID__"
+PORT_SENTINEL = "__PORT__"
+
+def _json_loads(data):
+    """Parse JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj):
+    """Serialize to indented JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, indent=2).encode()
+
+def _render(template, node_id):
+    """Fill node-specific values into a pre-serialized JSON template"""
+    return (template
+            .replace(f'"{PORT_SENTINEL}"'.encode(), str(8000 + node_id).encode())
+            .replace(NODE_ID_SENTINEL.encode(), f"node_{node_id}".encode()))
+
+_NODE_SCRIPT_TMPL = '''#!/bin/bash
+
+# RL-Swarm Node {node_id} Runner
+NODE_ID="node_{node_id}"
+NODE_DIR="$(pwd)"
+PORT={port}
+
+echo "🚀 Starting RL-Swarm Node {node_id}..."
+echo "Node Directory: $NODE_DIR"
+echo "Port: $PORT"
+
+# Activate virtual environment
+source venv_node_{node_id}/bin/activate
+
+# Check required files
+REQUIRED_FILES=("swarm.pem" "userApiKey.json" "userData.json")
+for file in "${{REQUIRED_FILES[@]}}"; do
+    if [ ! -f "$file" ]; then
+        echo "❌ Missing required file: $file"
+        echo "Please run: python prepare_credentials.py"
+        exit 1
+    fi
+done
+
+# Set proper permissions
+chmod 600 swarm.pem
+
+# Environment variables
+export CUDA_VISIBLE_DEVICES=0
+export NODE_ID="$NODE_ID"
+export GPU_MEMORY_FRACTION=0.1
+
+# GPU Memory settings
+export PYTORCH_CUDA_ALLOC_CONF="max_split_size_mb:8192"
+export TF_MEMORY_GROWTH=true
+
+# Create log file with timestamp
+LOG_FILE="logs/node_{node_id}_$(date +%Y%m%d_%H%M%S).log"
+echo "📝 Logging to: $LOG_FILE"
+
+# Run the main application
+echo "🏃 Running main application..."
+python main.py \\
+    --node-id "$NODE_ID" \\
+    --port "$PORT" \\
+    --gpu-memory-fraction 0.1 \\
+    2>&1 | tee "$LOG_FILE"
+
+EXIT_CODE=${{PIPESTATUS[0]}}
+
+if [ $EXIT_CODE -eq 0 ]; then
+    echo "✅ Node {node_id} completed successfully"
+else
+    echo "❌ Node {node_id} failed with exit code: $EXIT_CODE"
+fi
+
+deactivate
+exit $EXIT_CODE
+'''
+
+def create_node_script(node_dir, node_id):
+    """Tạo script chạy cho từng node"""
+    script_path = node_dir / f"run_node_{node_id}.sh"
+    script_path.write_text(_NODE_SCRIPT_TMPL.format(node_id=node_id, port=8000 + node_id))
+    
+    os.chmod(script_path, 0o755)
+    return script_path
+
+def _write_node_creds(i, cluster_dir, pem_src, api_template, data_template):
+    """Write swarm.pem, userApiKey.json, userData.json and run_node_X.sh for one node"""
+    node_dir = cluster_dir / f"node_{i}"
+    
+    # Hardlink swarm.pem (mode 0o600 is shared with the source inode)
+    pem_path = node_dir / "swarm.pem"
+    try:
+        pem_path.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(pem_src, pem_path)
+    except OSError:
+        # e.g. cross-device link when credentials_dir is a separate mount
+        shutil.copy2(pem_src, pem_path)
+        os.chmod(pem_path, 0o600)
+    
+    # Create modified userApiKey.json
+    (node_dir / "userApiKey.json").write_bytes(_render(api_template, i))
+    
+    # Create modified userData.json
+    (node_dir / "userData.json").write_bytes(_render(data_template, i))
+    
+    # Runner script only depends on node_id, so write it once here
+    create_node_script(node_dir, i)
+    
+    return i
+
 def prepare_credentials():
     cluster_dir = Path("rl-swarm-cluster")
     credentials_dir = cluster_dir / "credentials"
     
     print("🔧 Preparing credentials for all nodes...")
     
-    # Check if credential files exist
-    required_files = ["swarm.pem", "userApiKey.json", "userData.json"]
+    # Read credential files, collecting any that are missing
     missing_files = []
+    contents = {}
     
-    for file_name in required_files:
-        file_path = credentials_dir / file_name
-        if not file_path.exists():
+    # swarm.pem is only hardlinked, never read, so just check it is there
+    try:
+        os.stat(credentials_dir / "swarm.pem")
+    except FileNotFoundError:
+        missing_files.append("swarm.pem")
+    
+    for file_name in ["userApiKey.json", "userData.json"]:
+        try:
+            contents[file_name] = (credentials_dir / file_name).read_bytes()
+        except FileNotFoundError:
             missing_files.append(file_name)
     
     if missing_files:
@@ -29,54 +160,47 @@ def prepare_credentials():
     
     # Load base JSON files
     try:
-        with open(credentials_dir / "userApiKey.json") as f:
-            base_api_key = json.load(f)
-        
-        with open(credentials_dir / "userData.json") as f:
-            base_user_data = json.load(f)
+        base_api_key = _json_loads(contents["userApiKey.json"])
+        base_user_data = _json_loads(contents["userData.json"])
     except json.JSONDecodeError as e:
         print(f"❌ Error reading JSON files: {e}")
         return False
     
-    # Prepare credentials for each node
-    for i in range(1, 11):
-        node_dir = cluster_dir / f"node_{i}"
-        
-        print(f"🔑 Preparing credentials for node_{i}...")
-        
-        # Copy swarm.pem
-        shutil.copy2(credentials_dir / "swarm.pem", node_dir / "swarm.pem")
-        os.chmod(node_dir / "swarm.pem", 0o600)
-        
-        # Create modified userApiKey.json
-        api_key_data = base_api_key.copy()
-        
-        # Add node-specific modifications
-        api_key_data["node_id"] = f"node_{i}"
-        
-        # You might want to modify other fields based on your needs
-        # For example:
-        # if "account_id" in api_key_data:
-        #     api_key_data["account_id"] = f"{api_key_data['account_id']}_node_{i}"
-        
-        with open(node_dir / "userApiKey.json", 'w') as f:
-            json.dump(api_key_data, f, indent=2)
-        
-        # Create modified userData.json
-        user_data = base_user_data.copy()
-        
-        # Add node-specific modifications
-        user_data["node_id"] = f"node_{i}"
-        user_data["port"] = 8000 + i
-        
-        # You might want to modify other fields:
-        # if "worker_id" in user_data:
-        #     user_data["worker_id"] = f"worker_{i}"
-        
-        with open(node_dir / "userData.json", 'w') as f:
-            json.dump(user_data, f, indent=2)
-        
-        print(f"  ✅ Node_{i} credentials ready")
+    # Serialize templates once; only node_id and port differ per node
+    api_key_data = base_api_key.copy()
+    api_key_data["node_id"] = NODE_ID_SENTINEL
+    
+    # You might want to modify other fields based on your needs
+    # (use NODE_ID_SENTINEL where the value should be node-specific)
+    # For example:
+    # if "account_id" in api_key_data:
+    #     api_key_data["account_id"] = f"{api_key_data['account_id']}_{NODE_ID_SENTINEL}"
+    
+    api_key_template = _json_dumps(api_key_data)
+    
+    user_data = base_user_data.copy()
+    user_data["node_id"] = NODE_ID_SENTINEL
+    user_data["port"] = PORT_SENTINEL
+    
+    # You might want to modify other fields:
+    # if "worker_id" in user_data:
+    #     user_data["worker_id"] = f"worker_{NODE_ID_SENTINEL}"
+    
+    user_data_template = _json_dumps(user_data)
+    
+    # Set permissions once on the source; node copies are hardlinks to it
+    os.chmod(credentials_dir / "swarm.pem", 0o600)
+    
+    # Prepare credentials for each node (pure I/O, so threads are enough)
+    print("🔑 Preparing credentials for node_1..node_10...")
+    write_node = partial(_write_node_creds,
+                         cluster_dir=cluster_dir,
+                         pem_src=credentials_dir / "swarm.pem",
+                         api_template=api_key_template,
+                         data_template=user_data_template)
+    with ThreadPoolExecutor(max_workers=10) as ex:
+        for i in ex.map(write_node, range(1, 11)):
+            print(f"  ✅ Node_{i} credentials ready")
     
     print("\n🎉 All credentials prepared successfully!")
     print("\nYou can now run: python run_cluster.py")
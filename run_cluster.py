@@ -1,165 +1,216 @@
+import asyncio
 import os
-import subprocess
-import time
 import signal
 import sys
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 
+# Number of nodes allowed to be starting up at the same time
+MAX_CONCURRENT_STARTS = 4
+# Seconds to wait for a node's first output before freeing its start slot
+READY_TIMEOUT = 30
+# Read size for node output; one log write and one console write per chunk
+TEE_CHUNK_SIZE = 64 * 1024
+# Files every node directory needs before it can start
+REQUIRED_NODE_FILES = ("swarm.pem", "userApiKey.json", "userData.json", "main.py")
+
+@dataclass(slots=True)
+class NodeCfg:
+    """Paths used by a single node, built once per cluster"""
+    node_id: int
+    node_dir: Path
+    venv: Path
+    python: Path
+
+class NodeProtocol(asyncio.subprocess.SubprocessStreamProtocol):
+    """Stream protocol that also reports the moment the node process exits"""
+
+    def __init__(self, limit, loop):
+        super().__init__(limit=limit, loop=loop)
+        # Process.wait() also waits for the pipes to close, which a
+        # grandchild holding stdout can delay indefinitely
+        self.exited = loop.create_future()
+
+    def process_exited(self):
+        returncode = self._transport.get_returncode()
+        super().process_exited()
+        if not self.exited.done():
+            self.exited.set_result(returncode)
+
 class ClusterManager:
     def __init__(self, cluster_dir="rl-swarm-cluster", total_nodes=10):
         self.cluster_dir = Path(cluster_dir)
         self.total_nodes = total_nodes
         self.processes = []
-        
-    def create_node_script(self, node_id):
-        """Tạo script chạy cho từng node"""
-        node_dir = self.cluster_dir / f"node_{node_id}"
-        
-        script_content = f'''#!/bin/bash
-
-# RL-Swarm Node {node_id} Runner
-NODE_ID="node_{node_id}"
-NODE_DIR="$(pwd)"
-PORT=$((8000 + {node_id}))
-
-echo "🚀 Starting RL-Swarm Node {node_id}..."
-echo "Node Directory: $NODE_DIR"
-echo "Port: $PORT"
-
-# Activate virtual environment
-source venv_node_{node_id}/bin/activate
-
-# Check required files
-REQUIRED_FILES=("swarm.pem" "userApiKey.json" "userData.json")
-for file in "${{REQUIRED_FILES[@]}}"; do
-    if [ ! -f "$file" ]; then
-        echo "❌ Missing required file: $file"
-        echo "Please run: python prepare_credentials.py"
-        exit 1
-    fi
-done
-
-# Set proper permissions
-chmod 600 swarm.pem
-
-# Environment variables
-export CUDA_VISIBLE_DEVICES=0
-export NODE_ID="$NODE_ID"
-export GPU_MEMORY_FRACTION=0.1
-
-# GPU Memory settings
-export PYTORCH_CUDA_ALLOC_CONF="max_split_size_mb:8192"
-export TF_MEMORY_GROWTH=true
-
-# Create log file with timestamp
-LOG_FILE="logs/node_{node_id}_$(date +%Y%m%d_%H%M%S).log"
-echo "📝 Logging to: $LOG_FILE"
-
-# Run the main application
-echo "🏃 Running main application..."
-python main.py \\
-    --node-id "$NODE_ID" \\
-    --port "$PORT" \\
-    --gpu-memory-fraction 0.1 \\
-    2>&1 | tee "$LOG_FILE"
-
-EXIT_CODE=${{PIPESTATUS[0]}}
-
-if [ $EXIT_CODE -eq 0 ]; then
-    echo "✅ Node {node_id} completed successfully"
-else
-    echo "❌ Node {node_id} failed with exit code: $EXIT_CODE"
-fi
-
-deactivate
-exit $EXIT_CODE
-'''
-        
-        script_path = node_dir / f"run_node_{node_id}.sh"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
-        
-        os.chmod(script_path, 0o755)
-        return script_path
-    
+        # Nodes that exited but whose output pipes may still be open
+        self.stopped = []
+
+        root = self.cluster_dir.resolve()
+        self.nodes = []
+        for i in range(1, total_nodes + 1):
+            node_dir = root / f"node_{i}"
+            venv = node_dir / f"venv_node_{i}"
+            self.nodes.append(NodeCfg(i, node_dir, venv, venv / "bin" / "python"))
+
+        self._ready_nodes, self._missing_files = self._scan_ready()
+
+    def _scan_ready(self):
+        """Scan the cluster once, return ready node ids and missing files per node"""
+        try:
+            with os.scandir(self.cluster_dir) as entries:
+                dir_names = {e.name for e in entries if e.is_dir()}
+        except FileNotFoundError:
+            dir_names = set()
+
+        ready_nodes = set()
+        missing_files = {}
+        for node in self.nodes:
+            names = set()
+            if node.node_dir.name in dir_names:
+                with os.scandir(node.node_dir) as entries:
+                    names = {e.name for e in entries}
+
+            if set(REQUIRED_NODE_FILES) <= names:
+                ready_nodes.add(node.node_id)
+            else:
+                missing_files[node.node_id] = [f for f in REQUIRED_NODE_FILES if f not in names]
+
+        return ready_nodes, missing_files
+
+    def invalidate(self):
+        """Re-scan node directories, e.g. after running prepare_credentials.py"""
+        self._ready_nodes, self._missing_files = self._scan_ready()
+
     def check_node_ready(self, node_id):
         """Check if node is ready to run"""
-        node_dir = self.cluster_dir / f"node_{node_id}"
-        
-        required_files = [
-            node_dir / "swarm.pem",
-            node_dir / "userApiKey.json", 
-            node_dir / "userData.json",
-            node_dir / "main.py"
-        ]
-        
-        missing_files = [f.name for f in required_files if not f.exists()]
-        
-        if missing_files:
-            print(f"❌ Node_{node_id} missing files: {missing_files}")
-            return False
-        
-        return True
-    
-    def start_node(self, node_id):
-        """Start a specific node"""
-        if not self.check_node_ready(node_id):
-            print(f"❌ Node_{node_id} not ready. Run 'python prepare_credentials.py' first.")
-            return None
-        
-        node_dir = self.cluster_dir / f"node_{node_id}"
-        script_path = self.create_node_script(node_id)
-        
-        # Environment variables
+        if node_id in self._ready_nodes:
+            return True
+
+        print(f"❌ Node_{node_id} missing files: {self._missing_files[node_id]}")
+        return False
+
+    def node_env(self, node_id):
+        """Environment for a node, equivalent to activating its venv"""
+        venv_dir = self.nodes[node_id - 1].venv
+
         env = os.environ.copy()
         env.update({
             'NODE_ID': f'node_{node_id}',
+            'VIRTUAL_ENV': str(venv_dir),
+            'PATH': f"{venv_dir / 'bin'}{os.pathsep}{env.get('PATH', '')}",
             'CUDA_VISIBLE_DEVICES': '0',
-            'GPU_MEMORY_FRACTION': '0.1'
+            'GPU_MEMORY_FRACTION': '0.1',
+            # Output is piped, so flush it immediately: readiness and logs depend on it
+            'PYTHONUNBUFFERED': '1',
+            # GPU Memory settings
+            'PYTORCH_CUDA_ALLOC_CONF': 'max_split_size_mb:8192',
+            'TF_MEMORY_GROWTH': 'true'
         })
-        
-        print(f"🚀 Starting node_{node_id}...")
-        
-        try:
-            process = subprocess.Popen(
-                [str(script_path)],
-                cwd=node_dir,
-                env=env,
-                preexec_fn=os.setsid
-            )
-            
+        env.pop('PYTHONHOME', None)
+        return env
+
+    async def tee_output(self, process, log_path, ready):
+        """Copy node output to its log file and to the console until EOF"""
+        with open(log_path, 'wb') as log_file:
+            while True:
+                chunk = await process.stdout.read(TEE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                # First output means the node is up
+                ready.set()
+                log_file.write(chunk)
+                sys.stdout.buffer.write(chunk)
+                sys.stdout.flush()
+        ready.set()
+
+    async def start_node(self, node_id, start_slots):
+        """Start a specific node"""
+        if not self.check_node_ready(node_id):
+            print(f"❌ Node_{node_id} not ready. Run 'python prepare_credentials.py' first.")
+            return None
+
+        node = self.nodes[node_id - 1]
+        log_path = node.node_dir / "logs" / f"node_{node_id}_{datetime.now():%Y%m%d_%H%M%S}.log"
+
+        async with start_slots:
+            print(f"🚀 Starting node_{node_id}...")
+
+            try:
+                log_path.parent.mkdir(exist_ok=True)
+                loop = asyncio.get_running_loop()
+                transport, protocol = await loop.subprocess_exec(
+                    lambda: NodeProtocol(limit=TEE_CHUNK_SIZE, loop=loop),
+                    str(node.python), "main.py",
+                    "--node-id", f"node_{node_id}",
+                    "--port", str(8000 + node_id),
+                    "--gpu-memory-fraction", "0.1",
+                    cwd=node.node_dir,
+                    env=self.node_env(node_id),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True
+                )
+                process = asyncio.subprocess.Process(transport, protocol, loop)
+
+            except Exception as e:
+                print(f"❌ Failed to start node_{node_id}: {e}")
+                return None
+
+            ready = asyncio.Event()
             self.processes.append({
                 'node_id': node_id,
                 'process': process,
-                'script_path': script_path
+                'log_path': log_path,
+                'transport': transport,
+                'exited': protocol.exited,
+                'tee': asyncio.create_task(self.tee_output(process, log_path, ready))
             })
-            
+
+            # Hold the start slot until the node is up (or has already exited)
+            ready_waiter = asyncio.ensure_future(ready.wait())
+            await asyncio.wait([ready_waiter, protocol.exited], timeout=READY_TIMEOUT,
+                               return_when=asyncio.FIRST_COMPLETED)
+            ready_waiter.cancel()
+
             return process
-            
-        except Exception as e:
-            print(f"❌ Failed to start node_{node_id}: {e}")
-            return None
-    
-    def start_all_nodes(self):
+
+    async def start_all_nodes(self):
         """Start all nodes"""
         print(f"🚀 Starting {self.total_nodes} nodes...")
-        
+
+        # Limit how many nodes start up at once
+        start_slots = asyncio.Semaphore(MAX_CONCURRENT_STARTS)
+        processes = await asyncio.gather(*(
+            self.start_node(i, start_slots)
+            for i in range(1, self.total_nodes + 1)
+        ))
+
         success_count = 0
-        for i in range(1, self.total_nodes + 1):
-            process = self.start_node(i)
+        for i, process in enumerate(processes, 1):
             if process:
                 success_count += 1
                 print(f"✅ Node_{i} started")
-                time.sleep(3)  # Stagger startup
             else:
                 print(f"❌ Failed to start node_{i}")
-        
+
         print(f"🎉 Successfully started {success_count}/{self.total_nodes} nodes")
-    
-    def stop_all_nodes(self):
+
+    async def drain_output(self, proc_infos):
+        """Let the tees finish, but don't hang on a pipe a leftover child keeps open"""
+        tees = [p['tee'] for p in proc_infos]
+        if tees:
+            _, pending = await asyncio.wait(tees, timeout=3)
+            for tee in pending:
+                tee.cancel()
+
+        for proc_info in proc_infos:
+            proc_info['transport'].close()
+
+    async def stop_all_nodes(self):
         """Stop all nodes"""
         print("🛑 Stopping all nodes...")
-        
+
         for proc_info in self.processes:
             try:
                 os.killpg(os.getpgid(proc_info['process'].pid), signal.SIGTERM)
@@ -169,66 +220,79 @@ exit $EXIT_CODE
                     proc_info['process'].terminate()
                 except:
                     pass
-        
-        time.sleep(3)
-        
-        # Force kill if needed
+
+        running = [p['exited'] for p in self.processes if not p['exited'].done()]
+        if running:
+            await asyncio.wait(running, timeout=3)
+
+        # Force kill the whole process group, including any children the node left behind
         for proc_info in self.processes:
             try:
-                if proc_info['process'].poll() is None:
-                    proc_info['process'].kill()
+                os.killpg(proc_info['process'].pid, signal.SIGKILL)
             except:
                 pass
-        
+
+        await self.drain_output(self.processes + self.stopped)
+        self.stopped.clear()
+
         self.processes.clear()
         print("🎉 All nodes stopped")
-    
-    def monitor_nodes(self):
+
+    async def monitor_nodes(self):
         """Monitor running nodes"""
         print("👀 Monitoring nodes (Press Ctrl+C to stop all)...")
-        
-        try:
-            while True:
-                active_nodes = []
-                
-                for proc_info in self.processes[:]:
-                    if proc_info['process'].poll() is None:
-                        active_nodes.append(proc_info['node_id'])
-                    else:
-                        exit_code = proc_info['process'].returncode
-                        print(f"⚠️  Node_{proc_info['node_id']} stopped (exit code: {exit_code})")
-                        self.processes.remove(proc_info)
-                
-                print(f"📊 Active: {len(active_nodes)}/{self.total_nodes} nodes - {active_nodes}")
-                
-                if len(active_nodes) == 0:
-                    print("⚠️  All nodes stopped")
-                    break
-                
-                time.sleep(30)
-                
-        except KeyboardInterrupt:
-            print("\n🛑 Interrupt received")
-            self.stop_all_nodes()
 
-def main():
-    cluster = ClusterManager()
-    
+        waiters = {p['exited']: p for p in self.processes}
+
+        while waiters:
+            active_nodes = sorted(p['node_id'] for p in waiters.values())
+            print(f"📊 Active: {len(active_nodes)}/{self.total_nodes} nodes - {active_nodes}")
+
+            # Wake up only when a node exits
+            done, _ = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+
+            for waiter in done:
+                proc_info = waiters.pop(waiter)
+                print(f"⚠️  Node_{proc_info['node_id']} stopped (exit code: {waiter.result()})")
+                self.processes.remove(proc_info)
+                self.stopped.append(proc_info)
+
+        print("⚠️  All nodes stopped")
+        await self.drain_output(self.stopped)
+        self.stopped.clear()
+
+async def run(cluster):
     # Signal handlers
-    def signal_handler(signum, frame):
-        print("\n🛑 Stopping all nodes...")
-        cluster.stop_all_nodes()
-        sys.exit(0)
-    
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    
+    loop = asyncio.get_running_loop()
+    task = asyncio.current_task()
+    signals = (signal.SIGINT, signal.SIGTERM)
+
+    def ignore_signals():
+        # A second Ctrl+C must not cancel stop_all_nodes halfway through
+        for signum in signals:
+            loop.add_signal_handler(signum, lambda: None)
+
+    def interrupt():
+        ignore_signals()
+        task.cancel()
+
+    for signum in signals:
+        loop.add_signal_handler(signum, interrupt)
+
     try:
-        cluster.start_all_nodes()
-        cluster.monitor_nodes()
+        await cluster.start_all_nodes()
+        await cluster.monitor_nodes()
+    except asyncio.CancelledError:
+        print("\n🛑 Interrupt received")
+        await cluster.stop_all_nodes()
     except Exception as e:
+        ignore_signals()
         print(f"❌ Error: {e}")
-        cluster.stop_all_nodes()
+        await cluster.stop_all_nodes()
+
+def main():
+    cluster = ClusterManager()
+    asyncio.run(run(cluster))
 
 if __name__ == "__main__":
     main()